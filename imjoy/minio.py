@@ -8,6 +8,8 @@ import subprocess
 import sys
 import tempfile
 import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
 
 logging.basicConfig(stream=sys.stdout)
 logger = logging.getLogger("minio")
@@ -18,8 +20,22 @@ MATH_PATTERN = re.compile("{(.+?)}")
 EXECUTABLE_PATH = "bin"
 
 
+def _download_executable(url, path):
+    """Download a file to path atomically.
+
+    Concurrent callers (e.g. parallel test workers) never see a partial file.
+    """
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    urllib.request.urlretrieve(url, tmp_path)
+    os.replace(tmp_path, path)
+
+
+@lru_cache(maxsize=None)
 def setup_minio_executables():
-    """Download and install the minio client and server binary files."""
+    """Download and install the minio client and server binary files.
+
+    The setup only runs once per process.
+    """
     os.makedirs(EXECUTABLE_PATH, exist_ok=True)
     assert (
         sys.platform == "linux"
@@ -29,13 +45,13 @@ from https://min.io/ and place them under ./bin"
     minio_path = EXECUTABLE_PATH + "/minio"
     if not os.path.exists(minio_path):
         print("Minio server executable not found, downloading... ")
-        urllib.request.urlretrieve(
+        _download_executable(
             "https://dl.min.io/server/minio/release/linux-amd64/minio", minio_path
         )
 
     if not os.path.exists(mc_path):
         print("Minio client executable not found, downloading... ")
-        urllib.request.urlretrieve(
+        _download_executable(
             "https://dl.min.io/client/mc/release/linux-amd64/mc", mc_path
         )
 
@@ -212,6 +228,19 @@ class MinioClient:
             **kwargs,
         )
 
+    def admin_user_add_many(self, users, **kwargs):
+        """Add several users on MinIO.
+
+        The users are given as a dictionary of username and password,
+        the mc commands are run concurrently.
+        """
+        with ThreadPoolExecutor() as executor:
+            futures = [
+                executor.submit(self.admin_user_add, username, password, **kwargs)
+                for username, password in users.items()
+            ]
+            return [future.result() for future in futures]
+
     def admin_user_remove(self, username, **kwargs):
         """Remove user on MinIO."""
         return self._execute(
@@ -340,37 +340,52 @@ class S3Controller:
                 count = 0
                 # Stream support:
                 # https://github.com/tiangolo/fastapi/issues/58#issuecomment-469355469
-                current_chunk = b""
-                async for chunk in request.stream():
-                    current_chunk += chunk
-                    if len(current_chunk) > 5 * 1024 * 1024:
-                        count += 1
-                        part_fut = s3_client.upload_part(
+                # Parts are uploaded concurrently while the rest of the body
+                # is still being received
+
+                def upload_part(body, part_number):
+                    return asyncio.ensure_future(
+                        s3_client.upload_part(
                             Bucket=self.default_bucket,
-                            ContentLength=len(current_chunk),
+                            ContentLength=len(body),
                             Key=path,
-                            PartNumber=count,
+                            PartNumber=part_number,
                             UploadId=mpu["UploadId"],
-                            Body=current_chunk,
+                            Body=body,
                         )
-                        futs.append(part_fut)
-                        current_chunk = b""
-                # if multipart upload is activated
-                if len(futs) > 0:
-                    if len(current_chunk) > 0:
-                        # upload the last chunk
+                    )
+
+                current_chunk = bytearray()
+                try:
+                    async for chunk in request.stream():
+                        current_chunk += chunk
+                        if len(current_chunk) > 5 * 1024 * 1024:
+                            count += 1
+                            futs.append(upload_part(bytes(current_chunk), count))
+                            current_chunk = bytearray()
+                    # upload the last chunk if multipart upload is activated
+                    if len(futs) > 0 and len(current_chunk) > 0:
                         count += 1
-                        part_fut = s3_client.upload_part(
+                        futs.append(upload_part(bytes(current_chunk), count))
+                    parts = await asyncio.gather(*futs)
+                except Exception:
+                    # e.g. the client disconnected, do not leave the parts
+                    # uploading against a closed client
+                    for fut in futs:
+                        fut.cancel()
+                    await asyncio.gather(*futs, return_exceptions=True)
+                    try:
+                        await s3_client.abort_multipart_upload(
                             Bucket=self.default_bucket,
-                            ContentLength=len(current_chunk),
                             Key=path,
-                            PartNumber=count,
                             UploadId=mpu["UploadId"],
-                            Body=current_chunk,
                         )
-                        futs.append(part_fut)
+                    except Exception:  # pylint: disable=broad-except
+                        logger.exception("Failed to abort the upload of %s", path)
+                    raise
 
-                    parts = await asyncio.gather(*futs)
+                # if multipart upload is activated
+                if len(futs) > 0:
                     parts_info["Parts"] = [
                         {"PartNumber": i + 1, "ETag": part["ETag"]}
                         for i, part in enumerate(parts)
@@ -384,7 +399,7 @@ class S3Controller:
                     )
                 else:
                     response = await s3_client.put_object(
-                        Body=current_chunk,
+                        Body=bytes(current_chunk),
                         Bucket=self.default_bucket,
                         Key=path,
                         ContentLength=len(current_chunk),
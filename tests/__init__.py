@@ -1,11 +1,25 @@
 """Test the ImJoy engine."""
+import http.client
+import os
+import select
+import socket
+import subprocess
+import time
 import uuid
+from pathlib import Path
 
-SIO_PORT = 38283
-SIO_PORT2 = 38223
+ROOT_DIR = Path(__file__).resolve().parents[1]
+
+# Give each pytest-xdist worker its own block of ports so the servers do not collide
+WORKER_INDEX = int(os.environ.get("PYTEST_XDIST_WORKER", "gw0")[2:])
+PORT_BASE = 38283 + 4 * WORKER_INDEX
+
+SIO_PORT = PORT_BASE
+SIO_PORT2 = PORT_BASE + 1
 SIO_SERVER_URL = f"http://127.0.0.1:{SIO_PORT}"
 
-MINIO_PORT = 38483
+# The minio console takes the next port
+MINIO_PORT = PORT_BASE + 2
 MINIO_SERVER_URL = f"http://127.0.0.1:{MINIO_PORT}"
 MINIO_ROOT_USER = "minio"
 MINIO_ROOT_PASSWORD = str(uuid.uuid4())
@@ -22,3 +36,69 @@ def find_item(items, key, value):
         return None
 
     return filtered[0]
+
+
+def python_subprocess_env():
+    """Return the environment for spawning python subprocesses in tests.
+
+    The user site-packages directory is skipped to speed up interpreter startup,
+    and the checkout is importable even when the server runs in another directory.
+    """
+    env = os.environ.copy()
+    env["PYTHONNOUSERSITE"] = "1"
+    env["PYTHONPATH"] = os.pathsep.join(
+        filter(None, [str(ROOT_DIR), env.get("PYTHONPATH")])
+    )
+    return env
+
+
+def _is_ready(port, path):
+    """Probe a local http endpoint and return whether it responds with 200."""
+    conn = http.client.HTTPConnection("127.0.0.1", port, timeout=1)
+    try:
+        conn.connect()
+        # avoid the delayed ACK penalty for the small probe request on loopback
+        conn.sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        conn.request("GET", path)
+        return conn.getresponse().status == 200
+    except (OSError, http.client.HTTPException):
+        return False
+    finally:
+        conn.close()
+
+
+def wait_ready(proc, port, path, timeout=10):
+    """Wait until a server subprocess responds on its readiness endpoint."""
+    deadline = time.monotonic() + timeout
+    while not _is_ready(port, path):
+        if proc.poll() is not None:
+            raise RuntimeError(f"Server on port {port} exited with {proc.returncode}")
+        if time.monotonic() > deadline:
+            proc.kill()
+            raise TimeoutError(f"Server on port {port} is not ready after {timeout}s")
+        time.sleep(0.01)
+
+
+def stop_server(proc, timeout=2):
+    """Terminate a server subprocess and kill it if it does not exit in time."""
+    proc.terminate()
+    pidfd = None
+    # pidfd_open is only available with Python >= 3.9 on Linux >= 5.3
+    if hasattr(os, "pidfd_open"):
+        try:
+            pidfd = os.pidfd_open(proc.pid)  # pylint: disable=no-member
+        except OSError:
+            pass
+    if pidfd is None:
+        try:
+            proc.wait(timeout)
+        except subprocess.TimeoutExpired:
+            proc.kill()
+        return
+    try:
+        # the pidfd becomes readable once the process exits
+        select.select([pidfd], [], [], timeout)
+    finally:
+        os.close(pidfd)
+    if proc.poll() is None:
+        proc.kill()
@@ -1,16 +1,16 @@
 """Provide common pytest fixtures."""
+import asyncio
 import os
 import shutil
 import subprocess
 import sys
-import tempfile
-import time
+from pathlib import Path
 
 import pytest
 import requests
-from requests import RequestException
+from imjoy_rpc import connect_to_server
 
-from imjoy.minio import setup_minio_executables
+from imjoy.minio import EXECUTABLE_PATH, MinioClient, setup_minio_executables
 
 from . import (
     MINIO_PORT,
@@ -19,11 +19,40 @@ from . import (
     MINIO_SERVER_URL,
     SIO_PORT,
     SIO_PORT2,
+    SIO_SERVER_URL,
+    python_subprocess_env,
+    stop_server,
+    wait_ready,
 )
 
 
+@pytest.fixture(name="worker_dir", scope="session")
+def worker_dir_fixture(tmp_path_factory):
+    """Provide a working directory private to the test worker.
+
+    The server writes ./apps and ./logs relative to its working directory and mc
+    keeps its aliases in MC_CONFIG_DIR, so pytest-xdist workers must not share them.
+    """
+    setup_minio_executables()
+    dirpath = tmp_path_factory.mktemp("worker")
+    # reuse the downloaded minio executables
+    bin_dir = Path(EXECUTABLE_PATH).resolve()
+    try:
+        (dirpath / EXECUTABLE_PATH).symlink_to(bin_dir, target_is_directory=True)
+    except OSError:
+        shutil.copytree(bin_dir, dirpath / EXECUTABLE_PATH)
+    # inherited by the mc commands and the server subprocesses
+    mc_config_dir = os.environ.get("MC_CONFIG_DIR")
+    os.environ["MC_CONFIG_DIR"] = str(dirpath / ".mc")
+    yield dirpath
+    if mc_config_dir is None:
+        del os.environ["MC_CONFIG_DIR"]
+    else:
+        os.environ["MC_CONFIG_DIR"] = mc_config_dir
+
+
 @pytest.fixture(name="socketio_server", scope="session")
-def socketio_server_fixture(minio_server):
+def socketio_server_fixture(minio_server, worker_dir):
     """Start server as test fixture and tear down after test."""
     with subprocess.Popen(
         [
@@ -36,26 +65,17 @@ def socketio_server_fixture(minio_server):
             f"--endpoint-url={MINIO_SERVER_URL}",
             f"--access-key-id={MINIO_ROOT_USER}",
             f"--secret-access-key={MINIO_ROOT_PASSWORD}",
-        ]
+        ],
+        env=python_subprocess_env(),
+        cwd=worker_dir,
     ) as proc:
-
-        timeout = 10
-        while timeout > 0:
-            try:
-                response = requests.get(f"http://127.0.0.1:{SIO_PORT}/liveness")
-                if response.ok:
-                    break
-            except RequestException:
-                pass
-            timeout -= 0.1
-            time.sleep(0.1)
+        wait_ready(proc, SIO_PORT, "/liveness")
         yield
-        proc.kill()
-        proc.terminate()
+        stop_server(proc)
 
 
-@pytest.fixture(name="socketio_subpath_server")
-def socketio_subpath_server_fixture(minio_server):
+@pytest.fixture(name="socketio_subpath_server", scope="module")
+def socketio_subpath_server_fixture(worker_dir):
     """Start server (under /my/engine) as test fixture and tear down after test."""
     with subprocess.Popen(
         [
@@ -64,31 +84,20 @@ def socketio_subpath_server_fixture(minio_server):
             "imjoy.server",
             f"--port={SIO_PORT2}",
             "--base-path=/my/engine",
-        ]
+        ],
+        env=python_subprocess_env(),
+        cwd=worker_dir,
     ) as proc:
-
-        timeout = 10
-        while timeout > 0:
-            try:
-                response = requests.get(
-                    f"http://127.0.0.1:{SIO_PORT2}/my/engine/liveness"
-                )
-                if response.ok:
-                    break
-            except RequestException:
-                pass
-            timeout -= 0.1
-            time.sleep(0.1)
+        wait_ready(proc, SIO_PORT2, "/my/engine/liveness")
         yield
-        proc.kill()
-        proc.terminate()
+        stop_server(proc)
 
 
 @pytest.fixture(name="minio_server", scope="session")
-def minio_server_fixture():
+def minio_server_fixture(tmp_path_factory):
     """Start minio server as test fixture and tear down after test."""
     setup_minio_executables()
-    dirpath = tempfile.mkdtemp()
+    dirpath = tmp_path_factory.mktemp("minio")
     my_env = os.environ.copy()
     my_env["MINIO_ROOT_USER"] = MINIO_ROOT_USER
     my_env["MINIO_ROOT_PASSWORD"] = MINIO_ROOT_PASSWORD
@@ -102,18 +111,87 @@ def minio_server_fixture():
         ],
         env=my_env,
     ) as proc:
-
-        timeout = 10
-        while timeout > 0:
-            try:
-                response = requests.get(f"{MINIO_SERVER_URL}/minio/health/live")
-                if response.ok:
-                    break
-            except RequestException:
-                pass
-            timeout -= 0.1
-            time.sleep(0.1)
+        wait_ready(proc, MINIO_PORT, "/minio/health/live")
         yield
 
-        proc.terminate()
-        shutil.rmtree(dirpath)
+        stop_server(proc)
+
+
+@pytest.fixture(name="minio_client", scope="session")
+def minio_client_fixture(minio_server, worker_dir):
+    """Provide a minio client shared by the session."""
+    return MinioClient(MINIO_SERVER_URL, MINIO_ROOT_USER, MINIO_ROOT_PASSWORD)
+
+
+@pytest.fixture(name="plugin_sources", scope="session")
+def plugin_sources_fixture():
+    """Read the test plugin sources once per session."""
+    base = Path(__file__).parent
+    return {
+        name: (base / name).read_text(encoding="utf-8")
+        for name in [
+            "testWindowPlugin1.imjoy.html",
+            "testWebPythonPlugin.imjoy.html",
+            "testWebWorkerPlugin.imjoy.html",
+            "testASGIWebPythonPlugin.imjoy.html",
+        ]
+    }
+
+
+@pytest.fixture(name="http_session", scope="session")
+def http_session_fixture():
+    """Provide a keep-alive HTTP session shared by the session."""
+    session = requests.Session()
+    # Skip compressing the large file bodies
+    session.headers["Accept-Encoding"] = "identity"
+    yield session
+    session.close()
+
+
+@pytest.fixture(name="event_loop", scope="session")
+def event_loop_fixture():
+    """Provide one event loop for the session so async fixtures can be shared."""
+    # create the loop directly, pytest-asyncio resets the loop policy on teardown
+    if sys.platform == "win32":
+        loop = asyncio.new_event_loop()
+    else:
+        import uvloop  # pylint: disable=import-outside-toplevel
+
+        loop = uvloop.new_event_loop()
+    yield loop
+    loop.close()
+
+
+@pytest.fixture(name="api", scope="module")
+async def api_fixture(socketio_server):
+    """Provide a client connected to the server, shared by the module."""
+    api = await connect_to_server({"name": "test client", "server_url": SIO_SERVER_URL})
+    yield api
+    await api.disconnect()
+
+
+@pytest.fixture(name="token", scope="module")
+async def token_fixture(api):
+    """Provide a token for the workspace of the api client."""
+    return await api.generate_token()
+
+
+@pytest.fixture(name="app_controller", scope="module")
+async def app_controller_fixture(api):
+    """Provide the server app controller for the api client."""
+    return await api.get_app_controller()
+
+
+@pytest.fixture(name="make_api")
+async def make_api_fixture(socketio_server):
+    """Provide a factory for extra clients and disconnect them after test."""
+    clients = []
+
+    async def make_api(config):
+        client = await connect_to_server({"server_url": SIO_SERVER_URL, **config})
+        clients.append(client)
+        return client
+
+    yield make_api
+    for client in clients:
+        await client.disconnect()
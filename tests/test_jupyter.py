@@ -4,46 +4,38 @@ import datetime
 import json
 import subprocess
 import sys
-import time
 import uuid
 
 import pytest
-import requests
-from requests import RequestException
 from websocket import create_connection
 
+from . import WORKER_INDEX, python_subprocess_env, stop_server, wait_ready
+
 # The token is written on stdout when you start the notebook
-PORT = 9999
+PORT = 9999 + WORKER_INDEX
 BASE_URL = f"http://localhost:{PORT}"
 
+# All execute requests of this run belong to the same kernel session
+SESSION_ID = uuid.uuid4().hex
+
 
-@pytest.fixture(name="jupyter_server")
+@pytest.fixture(name="jupyter_server", scope="module")
 def jupyter_server_fixture():
-    """Start server as test fixture and tear down after test."""
+    """Start server as test fixture and tear down after the tests."""
     with subprocess.Popen(
-        [sys.executable, "-m", "imjoy", "--jupyter", "--insecure", f"--port={PORT}"]
+        [sys.executable, "-m", "imjoy", "--jupyter", "--insecure", f"--port={PORT}"],
+        env=python_subprocess_env(),
     ) as proc:
-
-        timeout = 5
-        while timeout > 0:
-            try:
-                response = requests.get(BASE_URL + "/api/kernels")
-                if response.ok:
-                    break
-            except RequestException:
-                pass
-            timeout -= 0.1
-            time.sleep(0.1)
+        wait_ready(proc, PORT, "/api/kernels")
         yield
-
-        proc.terminate()
+        stop_server(proc)
 
 
 @pytest.fixture(name="websocket_connection")
-def websocket_connection_fixture(jupyter_server):
+def websocket_connection_fixture(jupyter_server, http_session):
     """Create websocket connection."""
     url = BASE_URL + "/api/kernels"
-    response = requests.post(url)
+    response = http_session.post(url)
     kernel = json.loads(response.text)
     assert "id" in kernel
     # Execution request/reply is done on websockets channels
@@ -61,7 +53,7 @@ def send_execute_request(code):
     hdr = {
         "msg_id": uuid.uuid1().hex,
         "username": "test",
-        "session": uuid.uuid1().hex,
+        "session": SESSION_ID,
         "data": datetime.datetime.now().isoformat(),
         "msg_type": msg_type,
         "version": "5.0",
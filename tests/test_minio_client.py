@@ -1,27 +1,20 @@
 """Test minio client."""
 import pytest
-from imjoy.minio import MinioClient
-from . import MINIO_SERVER_URL, MINIO_ROOT_USER, MINIO_ROOT_PASSWORD, find_item
+from . import find_item
 
 # All test coroutines will be treated as marked.
 pytestmark = pytest.mark.asyncio
 
 
 # pylint: disable=too-many-statements
-async def test_minio(minio_server):
+async def test_minio(minio_client):
     """Test minio client."""
-    minio_client = MinioClient(
-        MINIO_SERVER_URL,
-        MINIO_ROOT_USER,
-        MINIO_ROOT_PASSWORD,
-    )
     username = "tmp-user"
     username2 = "tmp-user-2"
 
-    minio_client.admin_user_add(username, "239udslfj3")
+    minio_client.admin_user_add_many({username: "239udslfj3", username2: "234slfj3"})
     # overwrite the password
     minio_client.admin_user_add(username, "23923432423j3")
-    minio_client.admin_user_add(username2, "234slfj3")
     user_list = minio_client.admin_user_list()
 
     assert find_item(user_list, "accessKey", username)
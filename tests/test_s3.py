@@ -3,20 +3,35 @@ import os
 
 import boto3
 import pytest
-import requests
-from imjoy_rpc import connect_to_server
 
 from . import SIO_SERVER_URL, find_item
 
 # All test coroutines will be treated as marked.
 pytestmark = pytest.mark.asyncio
 
+ACCESS_DENIED = r".*An error occurred (AccessDenied)*"
 
-async def test_s3(minio_server, socketio_server):
+
+def _random_body(head, size, chunk_size=1024 * 1024):
+    """Yield `head` followed by random chunks, `size` bytes in total."""
+    yield head
+    remaining = size - len(head)
+    while remaining > 0:
+        chunk = os.urandom(min(chunk_size, remaining))
+        remaining -= len(chunk)
+        yield chunk
+
+
+def _interrupted_body(size, chunk_size=1024 * 1024):
+    """Yield `size` random bytes and then fail, as if the client went away."""
+    for _ in range(size // chunk_size):
+        yield os.urandom(chunk_size)
+    raise RuntimeError("Upload interrupted")
+
+
+async def test_s3(minio_server, api, token, http_session, tmp_path):
     """Test s3 service."""
-    api = await connect_to_server({"name": "test client", "server_url": SIO_SERVER_URL})
     workspace = api.config["workspace"]
-    token = await api.generate_token()
 
     async with api.get_s3_controller() as s3controller:
         info = await s3controller.generate_credential()
@@ -30,17 +45,17 @@ async def test_s3(minio_server, socketio_server):
         bucket = s3_client.Bucket(info["bucket"])
 
         # Listing the root folder should fail
-        with pytest.raises(Exception, match=r".*An error occurred (AccessDenied)*"):
+        with pytest.raises(Exception, match=ACCESS_DENIED):
             print(list(bucket.objects.all()))
 
         obj = s3_client.Object(info["bucket"], info["prefix"] + "hello.txt")
-        with open("/tmp/hello.txt", "w", encoding="utf-8") as fil:
-            fil.write("hello")
-        obj.upload_file("/tmp/hello.txt")
+        hello_file = tmp_path / "hello.txt"
+        hello_file.write_text("hello", encoding="utf-8")
+        obj.upload_file(str(hello_file))
 
         # Upload small file (<5MB)
         content = os.urandom(2 * 1024 * 1024)
-        response = requests.put(
+        response = http_session.put(
             f"{SIO_SERVER_URL}/{workspace}/files/my-data-small.txt",
             headers={"Authorization": f"Bearer {token}"},
             data=content,
@@ -49,18 +64,19 @@ async def test_s3(minio_server, socketio_server):
             response.status_code == 200
         ), f"failed to upload {response.reason}: {response.text}"
 
-        # Upload large file with 100MB
-        content = os.urandom(100 * 1024 * 1024)
-        response = requests.put(
+        # Upload large file with 100MB, streamed so that only the first
+        # chunk is kept in memory for checking the range request
+        head = os.urandom(1024 * 1024)
+        response = http_session.put(
             f"{SIO_SERVER_URL}/{workspace}/files/my-data-large.txt",
             headers={"Authorization": f"Bearer {token}"},
-            data=content,
+            data=_random_body(head, 100 * 1024 * 1024),
         )
         assert (
             response.status_code == 200
         ), f"failed to upload {response.reason}: {response.text}"
 
-        response = requests.get(
+        response = http_session.get(
             f"{SIO_SERVER_URL}/{workspace}/files/",
             headers={"Authorization": f"Bearer {token}"},
         ).json()
@@ -68,26 +84,24 @@ async def test_s3(minio_server, socketio_server):
         assert find_item(response["children"], "Key", f"{workspace}/my-data-large.txt")
 
         # Test request with range
-        response = requests.get(
+        response = http_session.get(
             f"{SIO_SERVER_URL}/{workspace}/files/my-data-large.txt",
             headers={"Authorization": f"Bearer {token}", "Range": "bytes=10-1033"},
-            data=content,
         )
         assert len(response.content) == 1024
-        assert response.content == content[10:1034]
+        assert response.content == head[10:1034]
         assert response.ok
 
         # Delete the large file
-        response = requests.delete(
+        response = http_session.delete(
             f"{SIO_SERVER_URL}/{workspace}/files/my-data-large.txt",
             headers={"Authorization": f"Bearer {token}"},
-            data=content,
         )
         assert (
             response.status_code == 200
         ), f"failed to delete {response.reason}: {response.text}"
 
-        response = requests.get(
+        response = http_session.get(
             f"{SIO_SERVER_URL}/{workspace}/files/",
             headers={"Authorization": f"Bearer {token}"},
         ).json()
@@ -97,23 +111,23 @@ async def test_s3(minio_server, socketio_server):
         )
 
         # Should fail if we don't pass the token
-        response = requests.get(f"{SIO_SERVER_URL}/{workspace}/files/hello.txt")
+        response = http_session.get(f"{SIO_SERVER_URL}/{workspace}/files/hello.txt")
         assert not response.ok
 
-        response = requests.get(
+        response = http_session.get(
             f"{SIO_SERVER_URL}/{workspace}/files/",
             headers={"Authorization": f"Bearer {token}"},
         )
         assert response.status_code == 200
 
-        response = requests.get(
+        response = http_session.get(
             f"{SIO_SERVER_URL}/{workspace}/files/hello.txt",
             headers={"Authorization": f"Bearer {token}"},
         )
         assert response.ok
         assert response.content == b"hello"
 
-        response = requests.get(
+        response = http_session.get(
             f"{SIO_SERVER_URL}/{workspace}/files/he",
             headers={"Authorization": f"Bearer {token}"},
         )
@@ -132,5 +146,26 @@ async def test_s3(minio_server, socketio_server):
 
         # Upload without the prefix should fail
         obj = s3_client.Object(info["bucket"], "hello.txt")
-        with pytest.raises(Exception, match=r".*An error occurred (AccessDenied)*"):
-            obj.upload_file("/tmp/hello.txt")
+        with pytest.raises(Exception, match=ACCESS_DENIED):
+            obj.upload_file(str(hello_file))
+
+
+async def test_s3_interrupted_upload(minio_server, api, token, http_session):
+    """Test that an interrupted upload does not leave a file behind."""
+    workspace = api.config["workspace"]
+    # send more than one 5MB part so that part uploads are in flight
+    with pytest.raises(RuntimeError, match="Upload interrupted"):
+        http_session.put(
+            f"{SIO_SERVER_URL}/{workspace}/files/my-data-interrupted.txt",
+            headers={"Authorization": f"Bearer {token}"},
+            data=_interrupted_body(8 * 1024 * 1024),
+        )
+
+    response = http_session.get(
+        f"{SIO_SERVER_URL}/{workspace}/files/",
+        headers={"Authorization": f"Bearer {token}"},
+    ).json()
+    # an empty workspace has no listing at all
+    assert not find_item(
+        response.get("children", []), "Key", f"{workspace}/my-data-interrupted.txt"
+    )
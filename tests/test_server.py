@@ -1,19 +1,68 @@
 """Test the imjoy engine server."""
 import os
-import subprocess
 import sys
 import asyncio
+from contextlib import suppress
 
 
 import pytest
-from imjoy_rpc import connect_to_server
-from . import SIO_PORT, SIO_PORT2, SIO_SERVER_URL
+from . import SIO_PORT, SIO_PORT2, python_subprocess_env
 
 # All test coroutines will be treated as marked.
 pytestmark = pytest.mark.asyncio
 
-
-async def test_connect_to_server(socketio_server):
+PLUGIN_FILE = os.path.join(os.path.dirname(__file__), "example_plugin.py")
+
+# Expected error messages
+WORKSPACE_NOT_EXIST = r".*Workspace test does not exist.*"
+INVALID_SCOPES = r".*Scopes must be empty or contains only the workspace name*"
+PLUGIN_NOT_FOUND = r".*Plugin my plugin 2 not found.*"
+RENAME_NOT_ALLOWED = r".*Changing workspace name is not allowed.*"
+
+# Expected output of a runner that started the example plugin
+RUNNER_MARKERS = ("Generated token: ", "@imjoy@", "echo: a message")
+
+
+async def _run_runner(*args, until=()):
+    """Run the plugin runner, return the exit code, stdout and stderr.
+
+    If markers are given in `until`, the runner is terminated as soon as all of
+    them have shown up in stdout.
+    """
+    env = python_subprocess_env()
+    # flush the runner output line by line so it can be streamed
+    env["PYTHONUNBUFFERED"] = "1"
+    proc = await asyncio.create_subprocess_exec(
+        sys.executable,
+        "-m",
+        "imjoy.runner",
+        *args,
+        stdout=asyncio.subprocess.PIPE,
+        stderr=asyncio.subprocess.PIPE,
+        env=env,
+    )
+    if not until:
+        out, err = await proc.communicate()
+        return proc.returncode, out.decode("utf8"), err.decode("utf8")
+
+    # drain stderr meanwhile so the runner never blocks on a full pipe
+    err_task = asyncio.ensure_future(proc.stderr.read())
+    pending = set(until)
+    output = ""
+    async for line in proc.stdout:
+        text = line.decode("utf8")
+        output += text
+        pending = {marker for marker in pending if marker not in text}
+        if not pending:
+            with suppress(ProcessLookupError):
+                proc.terminate()
+            break
+    err = await err_task
+    await proc.wait()
+    return proc.returncode, output, err.decode("utf8")
+
+
+async def test_connect_to_server(make_api):
     """Test connecting to the server."""
 
     class ImJoyPlugin:
@@ -31,125 +80,82 @@ async def test_connect_to_server(socketio_server):
             await self._ws.log("hello world")
 
     # test workspace is an exception, so it can pass directly
-    ws = await connect_to_server(
-        {"name": "my plugin", "workspace": "public", "server_url": SIO_SERVER_URL}
-    )
-    with pytest.raises(Exception, match=r".*Workspace test does not exist.*"):
-        ws = await connect_to_server(
-            {"name": "my plugin", "workspace": "test", "server_url": SIO_SERVER_URL}
-        )
-    ws = await connect_to_server({"name": "my plugin", "server_url": SIO_SERVER_URL})
+    await make_api({"name": "my plugin", "workspace": "public"})
+    with pytest.raises(Exception, match=WORKSPACE_NOT_EXIST):
+        await make_api({"name": "my plugin", "workspace": "test"})
+    ws = await make_api({"name": "my plugin"})
     await ws.export(ImJoyPlugin(ws))
 
-    ws = await connect_to_server({"server_url": SIO_SERVER_URL})
+    ws = await make_api({})
     assert len(ws.config.name) == 36
 
 
-def test_plugin_runner(socketio_server):
+async def test_plugin_runner(socketio_server):
     """Test the plugin runner."""
-    with subprocess.Popen(
-        [
-            sys.executable,
-            "-m",
-            "imjoy.runner",
-            f"--server-url=http://127.0.0.1:{SIO_PORT}",
-            "--quit-on-ready",
-            os.path.join(os.path.dirname(__file__), "example_plugin.py"),
-        ],
-        stdout=subprocess.PIPE,
-        stderr=subprocess.PIPE,
-    ) as proc:
-        out, err = proc.communicate()
-        assert err.decode("utf8") == ""
-        output = out.decode("utf8")
-        assert "Generated token: " in output and "@imjoy@" in output
-        assert "echo: a message" in output
-
-
-def test_plugin_runner_subpath(socketio_subpath_server):
+    _, output, err = await _run_runner(
+        f"--server-url=http://127.0.0.1:{SIO_PORT}",
+        "--quit-on-ready",
+        PLUGIN_FILE,
+        until=RUNNER_MARKERS,
+    )
+    assert err == ""
+    assert "Generated token: " in output and "@imjoy@" in output
+    assert "echo: a message" in output
+
+
+async def test_plugin_runner_subpath(socketio_subpath_server):
     """Test the plugin runner with subpath server."""
-    with subprocess.Popen(
-        [
-            sys.executable,
-            "-m",
-            "imjoy.runner",
-            f"--server-url=http://127.0.0.1:{SIO_PORT2}/my/engine",
-            "--quit-on-ready",
-            os.path.join(os.path.dirname(__file__), "example_plugin.py"),
-        ],
-        stdout=subprocess.PIPE,
-        stderr=subprocess.PIPE,
-    ) as proc:
-        out, err = proc.communicate()
-        assert err.decode("utf8") == ""
-        output = out.decode("utf8")
-        assert "Generated token: " in output and "@imjoy@" in output
-        assert "echo: a message" in output
-
-
-async def test_plugin_runner_workspace(socketio_server):
-    """Test the plugin runner with workspace."""
-    api = await connect_to_server(
-        {"name": "my second plugin", "server_url": SIO_SERVER_URL}
+    _, output, err = await _run_runner(
+        f"--server-url=http://127.0.0.1:{SIO_PORT2}/my/engine",
+        "--quit-on-ready",
+        PLUGIN_FILE,
+        until=RUNNER_MARKERS,
     )
-    token = await api.generate_token()
+    assert err == ""
+    assert "Generated token: " in output and "@imjoy@" in output
+    assert "echo: a message" in output
+
+
+async def test_plugin_runner_workspace(api, token):
+    """Test the plugin runner with workspace."""
     assert "@imjoy@" in token
 
-    # The following code without passing the token should fail
-    # Here we assert the output message contains "permission denied"
-    with subprocess.Popen(
-        [
-            sys.executable,
-            "-m",
-            "imjoy.runner",
+    workspace = api.config["workspace"]
+    # Run the runner without and with the token at the same time,
+    # without passing the token it should fail
+    (code, output, err), (code2, output2, err2) = await asyncio.gather(
+        _run_runner(
             f"--server-url=http://127.0.0.1:{SIO_PORT}",
-            f"--workspace={api.config['workspace']}",
-            # f"--token={token}",
+            f"--workspace={workspace}",
             "--quit-on-ready",
-            os.path.join(os.path.dirname(__file__), "example_plugin.py"),
-        ],
-        stdout=subprocess.PIPE,
-        stderr=subprocess.PIPE,
-    ) as proc:
-        out, err = proc.communicate()
-        assert proc.returncode == 1
-        assert err.decode("utf8") == ""
-        output = out.decode("utf8")
-        assert "Permission denied for workspace:" in output
-
-    # now with the token, it should pass
-    with subprocess.Popen(
-        [
-            sys.executable,
-            "-m",
-            "imjoy.runner",
+            PLUGIN_FILE,
+        ),
+        _run_runner(
             f"--server-url=http://127.0.0.1:{SIO_PORT}",
-            f"--workspace={api.config['workspace']}",
+            f"--workspace={workspace}",
             f"--token={token}",
             "--quit-on-ready",
-            os.path.join(os.path.dirname(__file__), "example_plugin.py"),
-        ],
-        stdout=subprocess.PIPE,
-        stderr=subprocess.PIPE,
-    ) as proc:
-        out, err = proc.communicate()
-        assert proc.returncode == 0
-        assert err.decode("utf8") == ""
-        output = out.decode("utf8")
-        assert "Generated token: " in output and "@imjoy@" in output
-        assert "echo: a message" in output
-
-
-async def test_workspace(socketio_server):
+            PLUGIN_FILE,
+        ),
+    )
+
+    # Here we assert the output message contains "permission denied"
+    assert code == 1
+    assert err == ""
+    assert "Permission denied for workspace:" in output
+
+    # with the token, it should pass
+    assert code2 == 0
+    assert err2 == ""
+    assert "Generated token: " in output2 and "@imjoy@" in output2
+    assert "echo: a message" in output2
+
+
+async def test_workspace(api, token, make_api):
     """Test the plugin runner."""
-    api = await connect_to_server({"name": "my plugin", "server_url": SIO_SERVER_URL})
-    with pytest.raises(
-        Exception, match=r".*Scopes must be empty or contains only the workspace name*"
-    ):
+    with pytest.raises(Exception, match=INVALID_SCOPES):
         await api.generate_token({"scopes": ["test-workspace"]})
-    token = await api.generate_token()
     assert "@imjoy@" in token
-
     ws = await api.create_workspace(
         {
             "name": "test-workspace",
@@ -159,6 +165,7 @@ async def test_workspace(socketio_server):
             "visibility": "protected",  # or public
         }
     )
+
     await ws.log("hello")
     service_id = await ws.register_service(
         {
@@ -185,22 +192,17 @@ async def test_workspace(socketio_server):
     assert "user_id" in context and "email" in context
     assert service["name"] == "test_service"
 
-    # we should not get it because api is in another workspace
-    ss2 = await api.list_services({"type": "#test"})
+    # we should not get it because api is in another workspace,
+    # and let's generate a token for the test-workspace
+    ss2, ws_token = await asyncio.gather(
+        api.list_services({"type": "#test"}), ws.generate_token()
+    )
     assert len(ss2) == 0
 
-    # let's generate a token for the test-workspace
-    token = await ws.generate_token()
-
     # now if we connect directly to the workspace
     # we should be able to get the test-workspace services
-    api2 = await connect_to_server(
-        {
-            "name": "my plugin 2",
-            "workspace": "test-workspace",
-            "server_url": SIO_SERVER_URL,
-            "token": token,
-        }
+    api2 = await make_api(
+        {"name": "my plugin 2", "workspace": "test-workspace", "token": ws_token}
     )
     assert api2.config["workspace"] == "test-workspace"
     await api2.export({"foo": "bar"})
@@ -215,14 +217,14 @@ async def test_workspace(socketio_server):
     assert plugin.foo is None
     assert plugin.foo2 == "bar2"
 
-    with pytest.raises(Exception, match=r".*Plugin my plugin 2 not found.*"):
+    with pytest.raises(Exception, match=PLUGIN_NOT_FOUND):
         await api.get_plugin("my plugin 2")
 
     ws2 = await api.get_workspace("test-workspace")
     assert ws.config == ws2.config
 
     await ws2.set({"docs": "https://imjoy.io"})
-    with pytest.raises(Exception, match=r".*Changing workspace name is not allowed.*"):
+    with pytest.raises(Exception, match=RENAME_NOT_ALLOWED):
         await ws2.set({"name": "new-name"})
 
     with pytest.raises(Exception):
@@ -238,8 +240,6 @@ async def test_workspace(socketio_server):
 
     await ws2.emit("set-state", 9978)
 
-    assert await state == 9978
+    assert await asyncio.wait_for(state, 5) == 9978
 
     await ws2.off("set-state")
-
-    await api.disconnect()
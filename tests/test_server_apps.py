@@ -1,10 +1,7 @@
 """Test server apps."""
-from pathlib import Path
+import asyncio
 
 import pytest
-from imjoy_rpc import connect_to_server
-
-from . import SIO_SERVER_URL
 
 # pylint: disable=too-many-statements
 
@@ -31,85 +28,66 @@ api.export({
 })
 """
 
+IMJOY_PLUGINS = [
+    ("testWindowPlugin1.imjoy.html", "public/Test Window Plugin"),
+    ("testWebPythonPlugin.imjoy.html", "public/WebPythonPlugin"),
+    ("testWebWorkerPlugin.imjoy.html", "public/WebWorkerPlugin"),
+]
+
+
+async def _exercise_plugin(api, controller, token, source):
+    """Deploy, start and call an imjoy plugin, return its id and the result."""
+    pid = await controller.deploy(source, "public", "imjoy", overwrite=True)
+    try:
+        config = await controller.start(pid, api.config["workspace"], token)
+        try:
+            plugin = await api.get_plugin(config.name)
+            assert "add2" in plugin
+            result = await plugin.add2(4)
+        finally:
+            await controller.stop(config.name)
+    finally:
+        await controller.undeploy(pid)
+    return pid, result
+
 
-async def test_server_apps(socketio_server):
+async def test_server_apps(api, token, app_controller):
     """Test the server apps."""
-    api = await connect_to_server({"name": "test client", "server_url": SIO_SERVER_URL})
     workspace = api.config["workspace"]
-    token = await api.generate_token()
 
     # Test plugin with custom template
-    controller = await api.get_app_controller()
-    app_id = await controller.deploy(
+    app_id = await app_controller.deploy(
         TEST_APP_CODE, "public", "window-plugin.html", "test-window-plugin", True
     )
-    apps = await controller.list("public")
+    apps = await app_controller.list("public")
     assert app_id in apps
-    config = await controller.start(app_id, workspace, token)
-    plugin = await api.get_plugin(config.name)
-    assert "execute" in plugin
-    result = await plugin.execute(2, 4)
-    assert result == 6
-    webgpu_available = await plugin.check_webgpu()
-    assert webgpu_available is True
-    await controller.stop(config.name)
-
-    config = await controller.start(app_id, workspace, token)
-    plugin = await api.get_plugin(config.name)
-    assert "execute" in plugin
-    result = await plugin.execute(2, 4)
-    assert result == 6
-    webgpu_available = await plugin.check_webgpu()
-    assert webgpu_available is True
-    await controller.stop(config.name)
+    # Start the app twice to check that it can be restarted after a stop
+    for _ in range(2):
+        config = await app_controller.start(app_id, workspace, token)
+        plugin = await api.get_plugin(config.name)
+        assert "execute" in plugin
+        result, webgpu_available = await asyncio.gather(
+            plugin.execute(2, 4), plugin.check_webgpu()
+        )
+        assert result == 6
+        assert webgpu_available is True
+        await app_controller.stop(config.name)
 
-    # Test window plugin
-    source = (
-        (Path(__file__).parent / "testWindowPlugin1.imjoy.html")
-        .open(encoding="utf-8")
-        .read()
-    )
-    pid = await controller.deploy(
-        source, user_id="public", template="imjoy", overwrite=True
-    )
-    assert pid == "public/Test Window Plugin"
-    apps = await controller.list("public")
-    assert pid in apps
-    config = await controller.start(pid, workspace, token)
-    plugin = await api.get_plugin(config.name)
-    assert "add2" in plugin
-    result = await plugin.add2(4)
-    assert result == 6
-    await controller.stop(config.name)
-
-    source = (
-        (Path(__file__).parent / "testWebPythonPlugin.imjoy.html")
-        .open(encoding="utf-8")
-        .read()
-    )
-    pid = await controller.deploy(source, "public", "imjoy", overwrite=True)
-    assert pid == "public/WebPythonPlugin"
-    apps = await controller.list("public")
-    assert pid in apps
-    config = await controller.start(pid, workspace, token)
-    plugin = await api.get_plugin(config.name)
-    assert "add2" in plugin
-    result = await plugin.add2(4)
-    assert result == 6
-    await controller.stop(config.name)
 
-    source = (
-        (Path(__file__).parent / "testWebWorkerPlugin.imjoy.html")
-        .open(encoding="utf-8")
-        .read()
+async def test_server_apps_imjoy_plugins(api, token, app_controller, plugin_sources):
+    """Test deploying and running imjoy plugins as server apps."""
+    # The plugins are independent, exercise them concurrently and let every
+    # flow clean up before reporting the first failure
+    results = await asyncio.gather(
+        *(
+            _exercise_plugin(api, app_controller, token, plugin_sources[plugin_file])
+            for plugin_file, _ in IMJOY_PLUGINS
+        ),
+        return_exceptions=True,
     )
-    pid = await controller.deploy(source, "public", "imjoy", overwrite=True)
-    assert pid == "public/WebWorkerPlugin"
-    apps = await controller.list("public")
-    assert pid in apps
-    config = await controller.start(pid, workspace, token)
-    plugin = await api.get_plugin(config.name)
-    assert "add2" in plugin
-    result = await plugin.add2(4)
-    assert result == 6
-    await controller.stop(config.name)
+    for result in results:
+        if isinstance(result, Exception):
+            raise result
+    for (pid, result), (_, expected_pid) in zip(results, IMJOY_PLUGINS):
+        assert pid == expected_pid
+        assert result == 6